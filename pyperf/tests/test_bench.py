@@ -1,6 +1,10 @@
 import datetime
 import errno
 import gzip
+import io
+import os.path
+import shutil
+import tempfile
 import unittest
 
 import pyperf
@@ -9,19 +13,38 @@ from pyperf import tests
 
 NUMBER_TYPES = (int, float)
 
+# Shared metadata: Run copies its metadata, so these dicts are never modified
+_META_NAME_BENCH = {'name': 'bench'}
+_META_NAME_BENCH_TOTO = {'name': 'bench', 'hostname': 'toto'}
+_META_NAME_BENCH2_TOTO = {'name': 'bench2', 'hostname': 'toto'}
+_META_NAME_BENCH_HOMER = {'name': 'bench', 'hostname': 'homer'}
+
+# Run is immutable: share a single instance for the default create_run()
+_TEMPLATE_RUN = pyperf.Run((1.0,), metadata=_META_NAME_BENCH,
+                           collect_metadata=False)
+
 
 def create_run(values=None, warmups=None, metadata=None):
+    if values is None and warmups is None and metadata is None:
+        return _TEMPLATE_RUN
     if values is None:
         values = (1.0,)
     if metadata is None:
-        metadata = {'name': 'bench'}
+        metadata = _META_NAME_BENCH
     elif 'name' not in metadata:
-        metadata['name'] = 'bench'
+        metadata = dict(metadata, name='bench')
     return pyperf.Run(values, warmups,
                       metadata=metadata,
                       collect_metadata=False)
 
 
+def _roundtrip(obj):
+    # dump to JSON and load it back in memory, without a temporary file
+    fp = io.StringIO()
+    obj.dump(fp)
+    return type(obj).loads(fp.getvalue())
+
+
 class RunTests(unittest.TestCase):
     def test_attr(self):
         run = pyperf.Run((2.0, 3.0),
@@ -38,7 +61,8 @@ class RunTests(unittest.TestCase):
         self.assertEqual(run._get_raw_values(warmups=True),
                          [10.0, 20.0, 30.0])
 
-        run = pyperf.Run((2.0, 3.0), warmups=((1, 1.0),))
+        run = pyperf.Run((2.0, 3.0), warmups=((1, 1.0),),
+                         collect_metadata=False)
         self.assertEqual(run.get_loops(), 1)
         self.assertEqual(run.get_inner_loops(), 1)
         self.assertEqual(run.get_total_loops(), 1)
@@ -72,18 +96,19 @@ class RunTests(unittest.TestCase):
     def test_name(self):
         # name must be non-empty
         with self.assertRaises(ValueError):
-            pyperf.Run([1.0], metadata={'name': '   '})
+            pyperf.Run([1.0], metadata={'name': '   '},
+                       collect_metadata=False)
 
     def test_number_types(self):
         # ensure that all types of numbers are accepted
-        for number_type in NUMBER_TYPES:
-            run = pyperf.Run([number_type(1)], collect_metadata=False)
-            self.assertIsInstance(run.values[0], number_type)
+        for value in [number_type(1) for number_type in NUMBER_TYPES]:
+            with self.subTest(value=value):
+                run = pyperf.Run([value], warmups=[(4, value)],
+                                 collect_metadata=False)
+                self.assertIs(type(run.values[0]), type(value))
 
-            run = pyperf.Run([5], warmups=[(4, number_type(3))],
-                             collect_metadata=False)
-            self.assertEqual(run.warmups, ((4, 3),))
-            self.assertIsInstance(run.warmups[0][1], number_type)
+                self.assertEqual(run.warmups, ((4, 1),))
+                self.assertIs(type(run.warmups[0][1]), type(value))
 
     def test_get_date(self):
         date = datetime.datetime.now().isoformat(' ')
@@ -95,7 +120,43 @@ class RunTests(unittest.TestCase):
         self.assertIsNone(run._get_date())
 
 
+def _make_runs(values, loops, inner_loops):
+    # one run per value, all runs with the same metadata
+    metadata = {'key': 'value',
+                'loops': loops,
+                'inner_loops': inner_loops,
+                'name': 'mybench'}
+    return [pyperf.Run([value],
+                       warmups=[(1, 3.0)],
+                       metadata=metadata,
+                       collect_metadata=False)
+            for value in values]
+
+
 class BenchmarkTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # read-only benchmarks shared by tests which don't modify them
+        cls._bench_123_456 = pyperf.Benchmark([create_run([1.0, 2.0, 3.0]),
+                                               create_run([4.0, 5.0, 6.0])])
+        cls._bench_1234_56 = pyperf.Benchmark([create_run([1.0, 2.0, 3.0, 4.0]),
+                                               create_run([5.0, 6.0])])
+        cls._bench_warmups_exact = pyperf.Benchmark([
+            create_run((1.0, 2.0, 3.0), warmups=[(1, 1.0)]),
+            create_run((5.0, 6.0), warmups=[(1, 4.0)])])
+        cls._bench_warmups_average = pyperf.Benchmark([
+            create_run([3.0], warmups=[(1, 1.0), (1, 2.0)]),
+            create_run([4.0, 5.0, 6.0])])
+        cls._run1 = create_run([1.0])
+        cls._run2 = create_run([2.0])
+        cls._bench_run1_run2 = pyperf.Benchmark([cls._run1, cls._run2])
+        cls._dummy_bench = pyperf.Benchmark([create_run()])
+        cls._tmpdir = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls._tmpdir)
+
     def check_runs(self, bench, warmups, values):
         runs = bench.get_runs()
         self.assertEqual(len(runs), len(values))
@@ -105,52 +166,40 @@ class BenchmarkTests(unittest.TestCase):
 
     def test_name(self):
         # no name metadata
-        run = pyperf.Run([1.0])
+        run = pyperf.Run([1.0], collect_metadata=False)
         with self.assertRaises(ValueError):
             pyperf.Benchmark([run])
 
     def test_add_run(self):
-        metadata = {'name': 'bench', 'hostname': 'toto'}
-        runs = [create_run(metadata=metadata)]
+        runs = [create_run(metadata=_META_NAME_BENCH_TOTO)]
         bench = pyperf.Benchmark(runs)
 
         # expect Run, not list
         self.assertRaises(TypeError, bench.add_run, [1.0])
 
-        bench.add_run(create_run(metadata=metadata))
+        bench.add_run(create_run(metadata=_META_NAME_BENCH_TOTO))
 
         # incompatible: name is different
-        metadata = {'name': 'bench2', 'hostname': 'toto'}
         with self.assertRaises(ValueError):
-            bench.add_run(create_run(metadata=metadata))
+            bench.add_run(create_run(metadata=_META_NAME_BENCH2_TOTO))
 
         # incompatible: hostname is different
-        metadata = {'name': 'bench', 'hostname': 'homer'}
         with self.assertRaises(ValueError):
-            bench.add_run(create_run(metadata=metadata))
+            bench.add_run(create_run(metadata=_META_NAME_BENCH_HOMER))
 
         # compatible (same metadata)
-        metadata = {'name': 'bench', 'hostname': 'toto'}
-        bench.add_run(create_run(metadata=metadata))
+        bench.add_run(create_run(metadata=_META_NAME_BENCH_TOTO))
 
     def test_benchmark(self):
         values = (1.0, 1.5, 2.0)
-        raw_values = tuple(value * 3 * 20 for value in values)
-        runs = []
-        for value in values:
-            run = pyperf.Run([value],
-                             warmups=[(1, 3.0)],
-                             metadata={'key': 'value',
-                                       'loops': 20,
-                                       'inner_loops': 3,
-                                       'name': 'mybench'},
-                             collect_metadata=False)
-            runs.append(run)
+        # = [value * 3 * 20 for value in values]
+        raw_values = [60.0, 90.0, 120.0]
+        runs = _make_runs(values, 20, 3)
         bench = pyperf.Benchmark(runs)
 
         self.assertEqual(bench.get_values(), values)
         self.assertEqual(bench.get_unit(), 'second')
-        self.assertEqual(bench._get_raw_values(), list(raw_values))
+        self.assertEqual(bench._get_raw_values(), raw_values)
         self.assertEqual(bench.get_nrun(), 3)
 
         runs = bench.get_runs()
@@ -180,28 +229,21 @@ class BenchmarkTests(unittest.TestCase):
         bench = pyperf.Benchmark([run])
         self.assertEqual(bench.get_unit(), 'byte')
 
-    def create_dummy_benchmark(self):
-        runs = [create_run()]
-        return pyperf.Benchmark(runs)
-
     def check_benchmarks_equal(self, bench, bench2):
         self.assertEqual(bench.get_name(), bench2.get_name())
         self.assertEqual(bench.get_values(), bench2.get_values())
         self.assertEqual(bench.get_metadata(), bench2.get_metadata())
 
     def test_dump_load(self):
-        bench = self.create_dummy_benchmark()
-
-        with tests.temporary_file() as tmp_name:
-            bench.dump(tmp_name)
-            bench2 = pyperf.Benchmark.load(tmp_name)
-
+        bench = self._dummy_bench
+        bench2 = _roundtrip(bench)
         self.check_benchmarks_equal(bench, bench2)
 
     def test_dump_replace(self):
-        bench = self.create_dummy_benchmark()
+        bench = self._dummy_bench
 
-        with tests.temporary_file() as tmp_name:
+        tmp_name = os.path.join(self._tmpdir, 'bench.json')
+        try:
             bench.dump(tmp_name)
 
             # dump() must not override an existing file by default
@@ -211,25 +253,33 @@ class BenchmarkTests(unittest.TestCase):
 
             # ok if replace is true
             bench.dump(tmp_name, replace=True)
+        finally:
+            os.unlink(tmp_name)
 
     def test_dump_gzip(self):
-        bench = self.create_dummy_benchmark()
+        bench = self._dummy_bench
 
-        with tests.temporary_file(suffix='.gz') as tmp_name:
+        tmp_name = os.path.join(self._tmpdir, 'bench.json.gz')
+        try:
             bench.dump(tmp_name)
 
             with gzip.open(tmp_name, 'rt', encoding='utf-8') as fp:
                 json = fp.read()
+        finally:
+            os.unlink(tmp_name)
 
         expected = tests.benchmark_as_json(bench)
         self.assertEqual(json, expected)
 
     def test_load_gzip(self):
-        bench = self.create_dummy_benchmark()
+        bench = self._dummy_bench
 
-        with tests.temporary_file(suffix='.gz') as tmp_name:
+        tmp_name = os.path.join(self._tmpdir, 'bench.json.gz')
+        try:
             bench.dump(tmp_name)
             bench2 = pyperf.Benchmark.load(tmp_name)
+        finally:
+            os.unlink(tmp_name)
 
         self.check_benchmarks_equal(bench, bench2)
 
@@ -244,38 +294,24 @@ class BenchmarkTests(unittest.TestCase):
         self.assertEqual(bench.get_values(), values1 + values2)
 
     def test__get_nvalue_per_run(self):
-        # exact
-        runs = [create_run([1.0, 2.0, 3.0]),
-                create_run([4.0, 5.0, 6.0])]
-        bench = pyperf.Benchmark(runs)
-        nvalue = bench._get_nvalue_per_run()
-        self.assertEqual(nvalue, 3)
-        self.assertIsInstance(nvalue, int)
-
-        # average
-        runs = [create_run([1.0, 2.0, 3.0, 4.0]),
-                create_run([5.0, 6.0])]
-        bench = pyperf.Benchmark(runs)
-        nvalue = bench._get_nvalue_per_run()
-        self.assertEqual(nvalue, 3.0)
-        self.assertIsInstance(nvalue, float)
+        # (benchmark, expected, expected type): exact, then average
+        cases = ((self._bench_123_456, 3, int),
+                 (self._bench_1234_56, 3.0, float))
+        for bench, expected, expected_type in cases:
+            with self.subTest(expected_type=expected_type):
+                nvalue = bench._get_nvalue_per_run()
+                self.assertEqual(nvalue, expected)
+                self.assertIsInstance(nvalue, expected_type)
 
     def test_get_warmups(self):
-        # exact
-        runs = [create_run((1.0, 2.0, 3.0), warmups=[(1, 1.0)]),
-                create_run((5.0, 6.0), warmups=[(1, 4.0)])]
-        bench = pyperf.Benchmark(runs)
-        nwarmup = bench._get_nwarmup()
-        self.assertEqual(nwarmup, 1)
-        self.assertIsInstance(nwarmup, int)
-
-        # average
-        runs = [create_run([3.0], warmups=[(1, 1.0), (1, 2.0)]),
-                create_run([4.0, 5.0, 6.0])]
-        bench = pyperf.Benchmark(runs)
-        nwarmup = bench._get_nwarmup()
-        self.assertEqual(nwarmup, 1)
-        self.assertIsInstance(nwarmup, float)
+        # (benchmark, expected, expected type): exact, then average
+        cases = ((self._bench_warmups_exact, 1, int),
+                 (self._bench_warmups_average, 1, float))
+        for bench, expected, expected_type in cases:
+            with self.subTest(expected_type=expected_type):
+                nwarmup = bench._get_nwarmup()
+                self.assertEqual(nwarmup, expected)
+                self.assertIsInstance(nwarmup, expected_type)
 
     def test_get_nvalue(self):
         bench = pyperf.Benchmark([create_run([2.0, 3.0])])
@@ -285,11 +321,8 @@ class BenchmarkTests(unittest.TestCase):
         self.assertEqual(bench.get_nvalue(), 3)
 
     def test_get_runs(self):
-        run1 = create_run([1.0])
-        run2 = create_run([2.0])
-
-        bench = pyperf.Benchmark([run1, run2])
-        self.assertEqual(bench.get_runs(), [run1, run2])
+        self.assertEqual(self._bench_run1_run2.get_runs(),
+                         [self._run1, self._run2])
 
     def test_get_total_duration(self):
         # use duration metadata
@@ -349,7 +382,7 @@ class BenchmarkTests(unittest.TestCase):
         runs = []
         for value in (1.0, 2.0, 3.0):
             runs.append(pyperf.Run((value,),
-                                   metadata={'name': 'bench'},
+                                   metadata=_META_NAME_BENCH,
                                    collect_metadata=False))
         bench = pyperf.Benchmark(runs)
         self.assertEqual(bench.get_metadata(),
@@ -402,7 +435,17 @@ class BenchmarkTests(unittest.TestCase):
 
 
 class TestBenchmarkSuite(unittest.TestCase):
-    def benchmark(self, name):
+    @classmethod
+    def setUpClass(cls):
+        cls._dummy_suite = cls.create_dummy_suite()
+        cls._tmpdir = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls._tmpdir)
+
+    @staticmethod
+    def benchmark(name):
         run = pyperf.Run([1.0, 1.5, 2.0],
                          metadata={'name': name},
                          collect_metadata=False)
@@ -420,9 +463,10 @@ class TestBenchmarkSuite(unittest.TestCase):
         with self.assertRaises(KeyError):
             suite.get_benchmark('non_existent')
 
-    def create_dummy_suite(self):
-        telco = self.benchmark('telco')
-        go = self.benchmark('go')
+    @classmethod
+    def create_dummy_suite(cls):
+        telco = cls.benchmark('telco')
+        go = cls.benchmark('go')
         return pyperf.BenchmarkSuite([telco, go])
 
     def check_dummy_suite(self, suite):
@@ -432,20 +476,16 @@ class TestBenchmarkSuite(unittest.TestCase):
         self.assertEqual(benchmarks[1].get_name(), 'go')
 
     def test_json(self):
-        suite = self.create_dummy_suite()
-
-        with tests.temporary_file() as filename:
-            suite.dump(filename)
-            suite = pyperf.BenchmarkSuite.load(filename)
-
-        self.assertEqual(suite.filename, filename)
+        suite = _roundtrip(self._dummy_suite)
+        self.assertIsNone(suite.filename)
 
         self.check_dummy_suite(suite)
 
     def test_dump_replace(self):
-        suite = self.create_dummy_suite()
+        suite = self._dummy_suite
 
-        with tests.temporary_file() as tmp_name:
+        tmp_name = os.path.join(self._tmpdir, 'suite.json')
+        try:
             suite.dump(tmp_name)
 
             # dump() must not override an existing file by default
@@ -456,16 +496,24 @@ class TestBenchmarkSuite(unittest.TestCase):
             # ok if replace is true
             suite.dump(tmp_name, replace=True)
 
+            suite2 = pyperf.BenchmarkSuite.load(tmp_name)
+            self.assertEqual(suite2.filename, tmp_name)
+            self.check_dummy_suite(suite2)
+        finally:
+            os.unlink(tmp_name)
+
     def test_add_runs(self):
         # bench 1
         values = (1.0, 2.0, 3.0)
-        run = pyperf.Run(values, metadata={'name': "bench"})
+        run = pyperf.Run(values, metadata=_META_NAME_BENCH,
+                         collect_metadata=False)
         bench = pyperf.Benchmark([run])
         suite = pyperf.BenchmarkSuite([bench])
 
         # bench 2
         values2 = (4.0, 5.0, 6.0)
-        run = pyperf.Run(values2, metadata={'name': "bench"})
+        run = pyperf.Run(values2, metadata=_META_NAME_BENCH,
+                         collect_metadata=False)
         bench2 = pyperf.Benchmark([run])
         suite.add_runs(bench2)
 